@@ -1,10 +1,15 @@
 # app.py
 import streamlit as st
 import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from math import sqrt
+import numpy as np
 import json
-from pathlib import Path
+import os
+import orjson
+import hashlib
+import time
 
 # =========================
 # 🔧 CONFIG (edit as needed)
@@ -20,6 +25,9 @@ TOL_P120_PCT = 5.0
 # "Almost" = within 2× tolerance but not within main tolerance
 ALMOST_MULT = 2.0
 
+# Identical submissions within this window are only logged once
+LOG_DEDUP_MINUTES = 10.0
+
 # Apps Script endpoint is stored in Streamlit Secrets
 # .streamlit/secrets.toml:
 # [apps_script]
@@ -30,42 +38,102 @@ APPS_SCRIPT_URL = st.secrets["apps_script"]["resistor_url"]
 # 📦 Load resistor catalog
 # Expect R_nom, R_meas in kΩ and P_rating_W in W.
 # =========================
-with open(Path("data/resistors.json"), "r") as f:
-    RESISTORS = json.load(f)  # keys are "1"..."40"
+@st.cache_data
+def load_resistors(path: str, mtime: float) -> list:
+    # mtime is only part of the cache key, so edits to the file invalidate the cache
+    with open(path) as f:
+        catalog = json.load(f)  # keys are "1"..."40"
+    # Rebuild as a list indexed by resistor number (index 0 unused)
+    resistors = [None] * (max(int(k) for k in catalog) + 1)
+    for k, v in catalog.items():
+        resistors[int(k)] = v
+    return resistors
+
+CATALOG_PATH  = "data/resistors.json"
+CATALOG_MTIME = os.path.getmtime(CATALOG_PATH)
+RESISTORS = load_resistors(CATALOG_PATH, CATALOG_MTIME)  # RESISTORS[n] is resistor #n
 
 # =========================
 # 🧮 Helpers
 # =========================
-def pct_close(student_val: float, target_val: float, tol_pct: float) -> bool:
-    if target_val == 0:
-        return abs(student_val) < 1e-12
-    return abs(student_val - target_val) <= (tol_pct / 100.0) * abs(target_val)
+def classify(student_vals, target_vals, tol_pct):
+    # Elementwise (ok, almost): within tolerance, or within ALMOST_MULT× tolerance but not ok.
+    # Compared as |s - t| <= tol * |t| (no division) so verdicts at the exact edges
+    # match the original per-field check. Targets come from the catalog and are never zero.
+    s = np.asarray(student_vals, dtype=float)
+    t = np.asarray(target_vals, dtype=float)
+    tol_pct = np.asarray(tol_pct, dtype=float)
+    diff = np.abs(s - t)
+    ok = diff <= (tol_pct / 100.0) * np.abs(t)
+    almost = ~ok & (diff <= (tol_pct * ALMOST_MULT / 100.0) * np.abs(t))
+    return ok.tolist(), almost.tolist()
 
-def almost_within(student_val: float, target_val: float, tol_pct: float) -> bool:
-    if target_val == 0:
-        return False
-    return (not pct_close(student_val, target_val, tol_pct)) and pct_close(student_val, target_val, tol_pct * ALMOST_MULT)
+# Indexed by (ok << 1) | almost
+VERDICT_ICONS = ("❌", "⚠️", "✅", "✅")
 
 def verdict_icon(ok: bool, almost: bool = False) -> str:
-    if ok:
-        return "✅"
-    if almost:
-        return "⚠️"
-    return "❌"
-
-def expected_from_measured(R_meas_ohm: float, P_rating_W: float):
-    Vmax = sqrt(P_rating_W * R_meas_ohm)        # sqrt(P * R)
-    I120 = V_SUPPLY / R_meas_ohm                # V / R
-    P120 = (V_SUPPLY * V_SUPPLY) / R_meas_ohm   # V^2 / R
+    return VERDICT_ICONS[(ok << 1) | almost]
+
+def expected_from_measured(R_meas_ohm, P_rating_W,
+                           _V=V_SUPPLY, _V2=V_SUPPLY * V_SUPPLY, _sqrt=np.sqrt):
+    # Works elementwise on NumPy arrays as well as on plain floats.
+    # Constants are bound as defaults so they're locals, not global lookups.
+    Vmax = _sqrt(P_rating_W * R_meas_ohm)       # sqrt(P * R)
+    I120 = _V / R_meas_ohm                      # V / R
+    P120 = _V2 / R_meas_ohm                     # V^2 / R
     return Vmax, I120, P120
 
-def log_submission(payload: dict):
+@st.cache_data
+def precompute_expected(resistors: list):
+    # Catalog is static: one vectorized pass over all resistors (NaN for unused slots)
+    R_arr = np.array([float(v["R_meas"]) * 1e3 if v else np.nan for v in resistors])
+    P_arr = np.array([float(v.get("P_rating_W", 1.0)) if v else np.nan for v in resistors])
+    return expected_from_measured(R_arr, P_arr)
+
+def new_session() -> requests.Session:
+    s = requests.Session()
+    s.headers.update({"Content-Type": "application/json"})
+    return s
+
+@st.cache_resource
+def get_executor():
+    # Logging runs off the script thread so the verdict isn't held up by the POST.
+    # requests.Session isn't thread-safe, so each worker opens its own keep-alive
+    # session when it starts; worker.session is the calling thread's session.
+    worker = threading.local()
+
+    def init_worker():
+        worker.session = new_session()
+
+    return ThreadPoolExecutor(max_workers=4, initializer=init_worker), worker
+
+def submission_key(payload: dict) -> bytes:
+    # Hash of everything but the timestamp
+    return hashlib.blake2b(
+        orjson.dumps({k: v for k, v in payload.items() if k != "Time Stamp"}),
+        digest_size=16,
+    ).digest()
+
+def is_duplicate(key: bytes) -> bool:
+    # True if this submission is still in flight or was logged successfully recently.
+    # A finished-but-failed POST doesn't count, even before the polling loop has seen it.
+    for k, fut in st.session_state.get("log_futures", []):
+        if k == key and (not fut.done() or fut.result()[0] == 200):
+            return True
+    logged = st.session_state.get("logged", {})
+    return time.monotonic() - logged.get(key, float("-inf")) < LOG_DEDUP_MINUTES * 60
+
+def log_submission(body: bytes, url: str, worker: threading.local):
+    # Runs on an executor thread, so it must not call Streamlit cache getters:
+    # body is the orjson-encoded payload, url is resolved on the script thread
     try:
-        r = requests.post(APPS_SCRIPT_URL, json=payload, timeout=8)
+        r = worker.session.post(url, data=body, timeout=8)
         return r.status_code, r.text
     except Exception as e:
         return -1, str(e)
 
+VMAX_EXP, I120_EXP, P120_EXP = precompute_expected(RESISTORS)  # indexed like RESISTORS
+
 # =========================
 # 🖥️ UI
 # =========================
@@ -81,66 +149,80 @@ with st.expander("📘 What does the power rating mean?"):
         "For each resistor below, we use its specific rating from the catalog to compute the safe maximum voltage."
     )
 
-colA, colB = st.columns(2)
-with colA:
-    student_name    = st.text_input("Name (for credit)")
-with colB:
-    student_comment = st.text_input("Comment (optional)")
-
 res_num = st.number_input("Enter your resistor number (1–40)", min_value=1, max_value=40, step=1)
-rinfo = RESISTORS.get(str(int(res_num)))
-if not rinfo:
-    st.stop()
-    
-# Reference (in kΩ from JSON)
-R_ref_kohm = float(rinfo["R_meas"])
-R_ref_ohm  = R_ref_kohm * 1e3
-P_rating_W   = float(rinfo.get("P_rating_W", 1.0))  # default to 1 W if missing
+# Look up the resistor only when its number or the catalog file changes;
+# reuse the stashed values otherwise
+ref_key = (res_num, CATALOG_MTIME)
+if st.session_state.get("ref_key") != ref_key:
+    i = int(res_num)
+    rinfo = RESISTORS[i] if i < len(RESISTORS) else None
+    if not rinfo:
+        st.stop()
+    st.session_state.ref = (
+        float(rinfo["R_meas"]),                 # reference R (kΩ from JSON)
+        float(rinfo.get("P_rating_W", 1.0)),    # default to 1 W if missing
+        # Expected values from the INSTRUCTOR-MEASURED resistance (precomputed in Ω)
+        float(VMAX_EXP[i]), float(I120_EXP[i]), float(P120_EXP[i]),
+    )
+    st.session_state.ref_key = ref_key
+
+R_ref_kohm, P_rating_W, Vmax_exp, I120_exp, P120_exp = st.session_state.ref
 
 st.info(f"Resistor #{res_num} — **Rating:** {P_rating_W:g} W")
 
-st.subheader("Enter your measured/calculated values")
-c1, c2 = st.columns(2)
-with c1:
-    R_student_kohm = st.number_input("Measured resistance R (kΩ)", min_value=0.0, step=0.01, format="%.2f")
-    Vmax      = st.number_input("Maximum safe voltage V_max (V)", min_value=0.0, step=0.01, format="%.2f")
-with c2:
-    I_120_mA     = st.number_input("Current at 120 V (mA)", min_value=0.0, step=0.001, format="%.3f")
-    P_120_mW     = st.number_input("Power at 120 V (mW)",  min_value=0.0, step=0.01, format="%.2f")
+# Inputs are batched in a form so typing doesn't rerun the script; only submit does
+with st.form("resistor_check"):
+    colA, colB = st.columns(2)
+    with colA:
+        student_name    = st.text_input("Name (for credit)")
+    with colB:
+        student_comment = st.text_input("Comment (optional)")
+
+    st.subheader("Enter your measured/calculated values")
+    c1, c2 = st.columns(2)
+    with c1:
+        R_student_kohm = st.number_input("Measured resistance R (kΩ)", min_value=0.0, step=0.01, format="%.2f")
+        Vmax      = st.number_input("Maximum safe voltage V_max (V)", min_value=0.0, step=0.01, format="%.2f")
+    with c2:
+        I_120_mA     = st.number_input("Current at 120 V (mA)", min_value=0.0, step=0.001, format="%.3f")
+        P_120_mW     = st.number_input("Power at 120 V (mW)",  min_value=0.0, step=0.01, format="%.2f")
+
+    submitted = st.form_submit_button("Check my answers")
 
 I_120  = I_120_mA * 1e-3
 P_120  = P_120_mW * 1e-3
 
-# Expected values from the INSTRUCTOR-MEASURED resistance (convert to Ω for physics)
-Vmax_exp, I120_exp, P120_exp = expected_from_measured(R_ref_ohm, P_rating_W)
+if submitted:
+    st.session_state.log_notes = []  # logging results shown for this submission only
 
-if st.button("Check my answers"):
     # Part checks vs expected derived from instructor-measured R
-    r_ok     = pct_close(R_student_kohm, R_ref_kohm,     TOL_R_PCT)
-    vmax_ok  = pct_close(Vmax,      Vmax_exp,  TOL_VMAX_PCT)
-    i120_ok  = pct_close(I_120,     I120_exp,  TOL_I120_PCT)
-    p120_ok  = pct_close(P_120,     P120_exp,  TOL_P120_PCT)
-
-    r_almost     = almost_within(R_student_kohm, R_ref_kohm,     TOL_R_PCT)
-    vmax_almost  = almost_within(Vmax,      Vmax_exp,  TOL_VMAX_PCT)
-    i120_almost  = almost_within(I_120,     I120_exp,  TOL_I120_PCT)
-    p120_almost  = almost_within(P_120,     P120_exp,  TOL_P120_PCT)
+    ok, almost = classify(
+        [R_student_kohm, Vmax,     I_120,    P_120],
+        [R_ref_kohm,     Vmax_exp, I120_exp, P120_exp],
+        [TOL_R_PCT,      TOL_VMAX_PCT, TOL_I120_PCT, TOL_P120_PCT],
+    )
+    r_ok,     vmax_ok,     i120_ok,     p120_ok     = ok
+    r_almost, vmax_almost, i120_almost, p120_almost = almost
 
     all_correct = r_ok and vmax_ok and i120_ok and p120_ok
     any_almost  = r_almost or vmax_almost or i120_almost or p120_almost
 
-    st.markdown("### Results")
-    st.write(f"{verdict_icon(r_ok, r_almost)} **Measured R**")
-            #  f" - yours: {R_student_kohm:.6g} kΩ | expected: {R_ref_kohm:.6g} Ω (±{TOL_R_PCT:.0f}%)")
-    st.write(f"{verdict_icon(vmax_ok, vmax_almost)} **V_max**")
-            #  f" - yours: {Vmax:.6g} V | expected: {Vmax_exp:.6g} V (±{TOL_VMAX_PCT:.0f}%)")
-    st.write(f"{verdict_icon(i120_ok, i120_almost)} **I at 120 V**")
-            #  f" - yours: {I_120:.6g} A | expected: {I120_exp:.6g} A (±{TOL_I120_PCT:.0f}%)")
-    st.write(f"{verdict_icon(p120_ok, p120_almost)} **P at 120 V**")
-            #  f" - yours: {P_120:.6g} W | expected: {P120_exp:.6g} W (±{TOL_P120_PCT:.0f}%)")
+    # One markdown call instead of one st.write per row
+    lines = [
+        "### Results",
+        f"{verdict_icon(r_ok, r_almost)} **Measured R**",
+        #  f" - yours: {R_student_kohm:.6g} kΩ | expected: {R_ref_kohm:.6g} Ω (±{TOL_R_PCT:.0f}%)"
+        f"{verdict_icon(vmax_ok, vmax_almost)} **V_max**",
+        #  f" - yours: {Vmax:.6g} V | expected: {Vmax_exp:.6g} V (±{TOL_VMAX_PCT:.0f}%)"
+        f"{verdict_icon(i120_ok, i120_almost)} **I at 120 V**",
+        #  f" - yours: {I_120:.6g} A | expected: {I120_exp:.6g} A (±{TOL_I120_PCT:.0f}%)"
+        f"{verdict_icon(p120_ok, p120_almost)} **P at 120 V**",
+        #  f" - yours: {P_120:.6g} W | expected: {P120_exp:.6g} W (±{TOL_P120_PCT:.0f}%)"
+    ]
+    st.markdown("\n\n".join(lines))
 
     if all_correct:
-        st.success("✅ All correct! Your submission has been recorded for full credit.")
+        st.success("✅ All correct! Your submission is being recorded for full credit.")
         result_label = "Correct"
     elif any_almost:
         st.warning("⚠️ Close. Some answers are within 2× tolerance but not within the main tolerance.")
@@ -151,7 +233,7 @@ if st.button("Check my answers"):
 
     # Log to Google Sheets via Apps Script
     payload = {
-        "Time Stamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "Time Stamp": datetime.now().isoformat(sep=" ", timespec="seconds"),
         # "sheet": "2.2-Resistors",   # handle this sheet name in your Apps Script
         # "secret": st.secrets["apps_script"].get("shared_secret", ""),
         "Name": student_name,
@@ -173,11 +255,43 @@ if st.button("Check my answers"):
         # },
         "result": result_label
     }
-    
-    status, resp = log_submission(payload)
-    if status != 200:
-        st.info("Note: logging issue encountered. Your local check ran fine—please try again soon or notify your instructor.")
-        st.caption(f"(Logging status {status}: {resp})")
+
+    # Only "Correct"/"Almost" attempts are recorded; wrong guesses never hit Apps Script
+    if result_label != "Incorrect":
+        key = submission_key(payload)
+        if not is_duplicate(key):
+            executor, worker = get_executor()
+            fut = executor.submit(log_submission, orjson.dumps(payload), APPS_SCRIPT_URL, worker)
+            st.session_state.setdefault("log_futures", []).append((key, fut))
+        elif not st.session_state.get("log_futures"):
+            st.session_state.log_notes.append((200, ""))  # identical answers already recorded
+
+@st.fragment(run_every=1.0)
+def logging_status():
+    # Reruns on its own while this is on screen, so the outcome of the POST is shown
+    # without the student having to submit again. Only successful logs are
+    # remembered for de-duplication, so a failed one can simply be resubmitted.
+    pending = st.session_state.get("log_futures", [])
+    notes = st.session_state.setdefault("log_notes", [])
+    for item in [p for p in pending if p[1].done()]:
+        pending.remove(item)
+        key, fut = item
+        status, resp = fut.result()
+        if status == 200:
+            st.session_state.setdefault("logged", {})[key] = time.monotonic()
+        notes.append((status, resp))
+
+    if pending:
+        st.caption("⏳ Recording your submission…")
+    for status, resp in notes:
+        if status == 200:
+            st.caption("✅ Your submission has been recorded.")
+        else:
+            st.info("Note: logging issue encountered. Your local check ran fine—please try again soon or notify your instructor.")
+            st.caption(f"(Logging status {status}: {resp})")
+
+if st.session_state.get("log_futures") or st.session_state.get("log_notes"):
+    logging_status()
 
 # Footer
 st.markdown("""